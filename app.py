@@ -1,7 +1,15 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
+import sys
+from types import MappingProxyType
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from plotly_resampler import FigureResampler
+from tsdownsample import MinMaxLTTBDownsampler
 
 st.set_page_config(page_title="F1 Telemetry Analyzer", layout="wide")
 
@@ -62,7 +70,8 @@ def load_fastf1():
 fastf1, plotting = load_fastf1()
 plotting.setup_mpl()
 
-TEAM_COLORS = {
+# Read-only, with interned keys so lookups by interned team names compare by identity
+TEAM_COLORS = MappingProxyType({sys.intern(team): color for team, color in {
     "Red Bull": "#1E41FF",
     "Ferrari": "#DC0000",
     "Mercedes": "#00D2BE",
@@ -73,7 +82,7 @@ TEAM_COLORS = {
     "RB": "#6692FF",
     "Kick Sauber": "#52E252",
     "Haas": "#B6BABD"
-}
+}.items()})
 
 # Sidebar controls
 year = st.sidebar.selectbox("Select Year", list(range(2024, 2018, -1)), key='year_selector')
@@ -86,12 +95,43 @@ except Exception as e:
 selected_gp = st.sidebar.selectbox("Select Grand Prix", gp_list, key='gp_selector')
 session_type = st.sidebar.selectbox("Session", ['FP1', 'FP2', 'FP3', 'Q', 'R'], key='session_selector')
 
-@st.cache_data(show_spinner="Loading session data...")
+# Cache the Session handle itself so hits skip pickling and hashing the whole Session
+@st.cache_resource(show_spinner="Loading session data...")
 def load_session_data(year, gp, session_type):
     session = fastf1.get_session(year, gp, session_type)
-    session.load()
+    # Weather and race control messages are never displayed, so skip fetching them
+    session.load(laps=True, telemetry=True, weather=False, messages=False)
+    for col in ('Driver', 'Team', 'Compound', 'TrackStatus'):
+        session.laps[col] = session.laps[col].astype('category')
+    # Derived columns, computed once per cached session rather than on every rerun
+    for col in ('LapTime', 'Sector1Time', 'Sector2Time', 'Sector3Time'):
+        session.laps[f'{col}_s'] = session.laps[col].dt.total_seconds().astype('float32')
+    session.laps['HasPit'] = session.laps['PitOutTime'].notna()
     return session
 
+# Session is a cached singleton, so its identity is a stable cache key.
+# Laps keeps a reference to its Session, so share it rather than pickle a copy per hit.
+@st.cache_resource(hash_funcs={fastf1.core.Session: id})
+def get_driver_laps(session, driver):
+    return session.laps.pick_driver(driver).set_index('LapNumber', drop=False)
+
+@st.cache_resource(hash_funcs={fastf1.core.Session: id})
+def get_quicklaps(session, driver):
+    return get_driver_laps(session, driver).pick_quicklaps()
+
+@st.cache_data(hash_funcs={fastf1.core.Session: id})
+def get_telemetry(session, driver, lap_number):
+    lap = get_driver_laps(session, driver).loc[lap_number]
+    # Plain DataFrame: FastF1's Telemetry pickles its Session along with the data
+    telemetry = pd.DataFrame(
+        lap.get_car_data().add_distance()[['Distance', 'Speed', 'Throttle', 'Brake', 'RPM', 'DRS', 'nGear']]
+    )
+    for col in ('Distance', 'Speed', 'Throttle'):
+        telemetry[col] = pd.to_numeric(telemetry[col], downcast='float')
+    for col in ('RPM', 'DRS', 'nGear'):
+        telemetry[col] = pd.to_numeric(telemetry[col], downcast='unsigned')
+    return telemetry
+
 with st.spinner(f"🚥 Warming up the tires and loading {selected_gp} {session_type} data..."):
     try:
         session = load_session_data(year, selected_gp, session_type)
@@ -100,156 +140,207 @@ with st.spinner(f"🚥 Warming up the tires and loading {selected_gp} {session_t
         st.error(f"Error loading session: {e}")
         st.stop()
 
-# Driver selection
-driver1 = st.selectbox("Select Driver 1", drivers, key='driver1_selector')
-driver2 = st.selectbox("Select Driver 2", drivers, key='driver2_selector')
-
-driver1_laps = session.laps.pick_driver(driver1).pick_quicklaps()['LapNumber'].tolist()
-driver2_laps = session.laps.pick_driver(driver2).pick_quicklaps()['LapNumber'].tolist()
-
-selected_lap1 = st.selectbox(f"Select Lap for {driver1}", driver1_laps, key=f"lap_select_{driver1}")
-selected_lap2 = st.selectbox(f"Select Lap for {driver2}", driver2_laps, key=f"lap_select_{driver2}")
-
-lap1 = session.laps.pick_driver(driver1).loc[session.laps['LapNumber'] == selected_lap1].iloc[0]
-lap2 = session.laps.pick_driver(driver2).loc[session.laps['LapNumber'] == selected_lap2].iloc[0]
-
-telemetry1 = lap1.get_car_data().add_distance()
-telemetry2 = lap2.get_car_data().add_distance()
-
-team1 = lap1['Team']
-team2 = lap2['Team']
-color1 = TEAM_COLORS.get(team1, "#FFFFFF")
-color2 = TEAM_COLORS.get(team2, "#FFFFFF")
-
-# Telemetry comparison section
-st.subheader("📊 Telemetry Comparison")
-
-telemetry_metrics = {
-    'Speed': 'Speed (km/h)',
-    'Throttle': 'Throttle (%)',
-    'Brake': 'Brake (On/Off)',
-    'RPM': 'Engine RPM',
-    'DRS': 'DRS Activation',
-    'nGear': 'Gear Number'
-}
-
-selected_metrics = st.multiselect("Select telemetry metrics to compare", list(telemetry_metrics.keys()), default=['Speed'], key='metric_selector')
-
-for metric in selected_metrics:
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=telemetry1['Distance'], y=telemetry1[metric], mode='lines', name=f"{driver1} ({team1})", line=dict(color=color1)))
-    fig.add_trace(go.Scatter(x=telemetry2['Distance'], y=telemetry2[metric], mode='lines', name=f"{driver2} ({team2})", line=dict(color=color2)))
-    fig.update_layout(
-        title=f"{telemetry_metrics[metric]} Comparison",
-        xaxis_title="Distance (m)",
-        yaxis_title=telemetry_metrics[metric],
-        template='plotly_dark'
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-# Sector analysis
-st.subheader("⏱️ Sector Analysis")
-sectors = ['Sector 1 Time', 'Sector 2 Time', 'Sector 3 Time']
-sector_data = {
-    'Driver': [driver1, driver2],
-    'Sector 1 Time (s)': [lap1['Sector1Time'].total_seconds(), lap2['Sector1Time'].total_seconds()],
-    'Sector 2 Time (s)': [lap1['Sector2Time'].total_seconds(), lap2['Sector2Time'].total_seconds()],
-    'Sector 3 Time (s)': [lap1['Sector3Time'].total_seconds(), lap2['Sector3Time'].total_seconds()]
-}
-
-st.table(pd.DataFrame(sector_data))
-
-# Detailed race summaries
-st.subheader("📑 Detailed Race Summaries")
-
-lap_summaries = session.laps.groupby('Driver').agg(
-    Total_Laps=('LapNumber', 'max'),
-    Average_Lap_Time=('LapTime', lambda x: x.mean().total_seconds()),
-    Best_Lap_Time=('LapTime', lambda x: x.min().total_seconds()),
-    Pit_Stops=('PitOutTime', lambda x: x.notna().sum())
-).reset_index()
-
-st.dataframe(lap_summaries)
-
-# Animation control
-st.subheader("🎞️ Speed Animation Preview")
-animation_speed = st.slider("Animation Speed (lower is faster)", min_value=10, max_value=100, value=50, step=10, key='animation_speed_slider')
-
-if st.button("Start Speed Animation", key='start_animation_button'):
-    from time import sleep
-
-    placeholder = st.empty()
-    for i in range(1, len(telemetry1), 20):
-        fig_anim = go.Figure()
-        fig_anim.add_trace(go.Scatter(x=telemetry1['Distance'][:i], y=telemetry1['Speed'][:i], mode='lines', name=driver1, line=dict(color=color1)))
+# Driver, lap and metric widgets rerun only this fragment, not the session load above
+@st.fragment
+def telemetry_section(session, drivers):
+    # Driver selection
+    driver1 = st.selectbox("Select Driver 1", drivers, key='driver1_selector')
+    driver2 = st.selectbox("Select Driver 2", drivers, key='driver2_selector')
+
+    driver1_all_laps = get_driver_laps(session, driver1)
+    driver2_all_laps = get_driver_laps(session, driver2)
+
+    driver1_quicklaps = get_quicklaps(session, driver1)
+    driver2_quicklaps = get_quicklaps(session, driver2)
+
+    driver1_laps = driver1_quicklaps.index.tolist()
+    driver2_laps = driver2_quicklaps.index.tolist()
+
+    selected_lap1 = st.selectbox(f"Select Lap for {driver1}", driver1_laps, key=f"lap_select_{driver1}")
+    selected_lap2 = st.selectbox(f"Select Lap for {driver2}", driver2_laps, key=f"lap_select_{driver2}")
+
+    lap1 = driver1_all_laps.loc[selected_lap1]
+    lap2 = driver2_all_laps.loc[selected_lap2]
+
+    telemetry1 = get_telemetry(session, driver1, selected_lap1)
+    telemetry2 = get_telemetry(session, driver2, selected_lap2)
+
+    team1 = lap1['Team']
+    team2 = lap2['Team']
+    color1 = TEAM_COLORS.get(sys.intern(str(team1)), "#FFFFFF")
+    color2 = TEAM_COLORS.get(sys.intern(str(team2)), "#FFFFFF")
+
+    # Telemetry comparison section
+    st.subheader("📊 Telemetry Comparison")
+
+    telemetry_metrics = {
+        'Speed': 'Speed (km/h)',
+        'Throttle': 'Throttle (%)',
+        'Brake': 'Brake (On/Off)',
+        'RPM': 'Engine RPM',
+        'DRS': 'DRS Activation',
+        'nGear': 'Gear Number'
+    }
+
+    selected_metrics = st.multiselect("Select telemetry metrics to compare", list(telemetry_metrics.keys()), default=['Speed'], key='metric_selector')
+
+    if selected_metrics:
+        # One figure with a shared distance axis instead of a separate chart per metric
+        fig = FigureResampler(make_subplots(
+            rows=len(selected_metrics),
+            cols=1,
+            shared_xaxes=True,
+            vertical_spacing=0.04,
+            subplot_titles=[f"{telemetry_metrics[metric]} Comparison" for metric in selected_metrics]
+        ))
+        distance1 = telemetry1['Distance'].to_numpy(np.float32)
+        distance2 = telemetry2['Distance'].to_numpy(np.float32)
+        for row, metric in enumerate(selected_metrics, start=1):
+            fig.add_trace(go.Scattergl(mode='lines', name=f"{driver1} ({team1})", legendgroup='driver1', showlegend=row == 1, line=dict(color=color1)), hf_x=distance1, hf_y=telemetry1[metric].to_numpy(np.float32), row=row, col=1)
+            fig.add_trace(go.Scattergl(mode='lines', name=f"{driver2} ({team2})", legendgroup='driver2', showlegend=row == 1, line=dict(color=color2)), hf_x=distance2, hf_y=telemetry2[metric].to_numpy(np.float32), row=row, col=1)
+            fig.update_yaxes(title_text=telemetry_metrics[metric], row=row, col=1)
+        fig.update_xaxes(title_text="Distance (m)", row=len(selected_metrics), col=1)
+        fig.update_layout(
+            height=300 * len(selected_metrics) + 100,
+            template='plotly_dark'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Sector analysis
+    st.subheader("⏱️ Sector Analysis")
+    sector_data = {
+        'Driver': [driver1, driver2],
+        'Sector 1 Time (s)': [lap1['Sector1Time_s'], lap2['Sector1Time_s']],
+        'Sector 2 Time (s)': [lap1['Sector2Time_s'], lap2['Sector2Time_s']],
+        'Sector 3 Time (s)': [lap1['Sector3Time_s'], lap2['Sector3Time_s']]
+    }
+
+    st.table(pd.DataFrame(sector_data))
+
+    # Detailed race summaries
+    st.subheader("📑 Detailed Race Summaries")
+
+    lap_summaries = session.laps.groupby('Driver', sort=False, observed=True).agg(
+        Total_Laps=('LapNumber', 'max'),
+        Average_Lap_Time=('LapTime_s', 'mean'),
+        Best_Lap_Time=('LapTime_s', 'min'),
+        Pit_Stops=('HasPit', 'sum')
+    ).reset_index()
+
+    st.dataframe(lap_summaries)
+
+    # Animation control
+    st.subheader("🎞️ Speed Animation Preview")
+    animation_speed = st.slider("Animation Speed (lower is faster)", min_value=10, max_value=100, value=50, step=10, key='animation_speed_slider')
+
+    # Downsample once to a fixed budget so every frame costs the same
+    anim_distance = telemetry1['Distance'].to_numpy(np.float32)
+    anim_speed = telemetry1['Speed'].to_numpy(np.float32)
+    if len(anim_distance) > 500:
+        idx = MinMaxLTTBDownsampler().downsample(anim_distance, anim_speed, n_out=500)
+        anim_distance, anim_speed = anim_distance[idx], anim_speed[idx]
+
+    if len(anim_distance):
+        # Frames are played back in the browser, so the server builds the figure only once
+        frames = [
+            go.Frame(data=[go.Scattergl(x=anim_distance[:i], y=anim_speed[:i])])
+            for i in range(20, len(anim_distance) + 20, 20)
+        ]
+        fig_anim = go.Figure(
+            data=[go.Scattergl(x=anim_distance[:1], y=anim_speed[:1], mode='lines', name=driver1, line=dict(color=color1))],
+            frames=frames
+        )
         fig_anim.update_layout(
             title=f"{driver1} - Speed Animation",
-            xaxis_title="Distance (m)",
-            yaxis_title="Speed (km/h)",
-            template='plotly_dark'
+            xaxis=dict(title="Distance (m)", range=[float(anim_distance.min()), float(anim_distance.max())]),
+            yaxis=dict(title="Speed (km/h)", range=[0, float(anim_speed.max()) * 1.05]),
+            template='plotly_dark',
+            updatemenus=[dict(
+                type='buttons',
+                showactive=False,
+                buttons=[
+                    dict(label='Play', method='animate', args=[None, dict(
+                        frame=dict(duration=animation_speed, redraw=True),
+                        transition=dict(duration=0),
+                        fromcurrent=True
+                    )]),
+                    dict(label='Pause', method='animate', args=[[None], dict(
+                        frame=dict(duration=0, redraw=False),
+                        mode='immediate'
+                    )])
+                ]
+            )]
         )
-        placeholder.plotly_chart(fig_anim, use_container_width=True)
-        sleep(animation_speed / 1000)
-
-# Lap summary
-st.subheader("🗘️ Lap Summary")
-sum_df = pd.DataFrame({
-    'Driver': [driver1, driver2],
-    'Team': [team1, team2],
-    'Lap Time (s)': [lap1['LapTime'].total_seconds(), lap2['LapTime'].total_seconds()],
-    'Compound': [lap1['Compound'], lap2['Compound']],
-    'TrackStatus': [lap1['TrackStatus'], lap2['TrackStatus']]
-})
-st.table(sum_df)
-
-# Lap-by-lap comparison
-st.subheader("🔁 Lap-by-Lap Time Comparison")
-df1 = session.laps.pick_driver(driver1).pick_quicklaps()
-df2 = session.laps.pick_driver(driver2).pick_quicklaps()
-
-comparison_df = pd.DataFrame({
-    'Lap': df1['LapNumber'],
-    driver1: df1['LapTime'].dt.total_seconds(),
-    driver2: df2['LapTime'].dt.total_seconds()
-}).dropna()
-
-fig2 = go.Figure()
-fig2.add_trace(go.Scatter(x=comparison_df['Lap'], y=comparison_df[driver1], mode='lines+markers', name=driver1, line=dict(color=color1)))
-fig2.add_trace(go.Scatter(x=comparison_df['Lap'], y=comparison_df[driver2], mode='lines+markers', name=driver2, line=dict(color=color2)))
-fig2.update_layout(
-    title="Lap-by-Lap Time Comparison",
-    xaxis_title="Lap Number",
-    yaxis_title="Lap Time (s)",
-    template='plotly_dark'
-)
-st.plotly_chart(fig2, use_container_width=True)
-
-# Export section
-st.subheader("📁 Export Data")
-if st.button("Download Telemetry CSV", key='csv_download_button'):
-    csv_df = pd.DataFrame({
-        'Distance': telemetry1['Distance'],
-        f'{driver1}_Speed': telemetry1['Speed'],
-        f'{driver2}_Speed': telemetry2['Speed']
-    }).dropna()
-    csv = csv_df.to_csv(index=False).encode('utf-8')
-    st.download_button("Download Telemetry CSV", csv, file_name="telemetry_comparison.csv", mime="text/csv")
-
-if st.button("Download PDF Plot", key='pdf_download_button'):
-    import matplotlib.pyplot as plt
-
-    pdf_fig, pdf_ax = plt.subplots()
-    pdf_ax.plot(telemetry1['Distance'], telemetry1['Speed'], label=driver1, color=color1)
-    pdf_ax.plot(telemetry2['Distance'], telemetry2['Speed'], label=driver2, color=color2)
-    pdf_ax.set_xlabel("Distance")
-    pdf_ax.set_ylabel("Speed")
-    pdf_ax.set_title("Speed Comparison")
-    pdf_ax.legend()
-    pdf_buf = io.BytesIO()
-    pdf_fig.savefig(pdf_buf, format='pdf')
-    pdf_buf.seek(0)
-    st.download_button("Download PDF", pdf_buf, file_name="speed_plot.pdf")
-    plt.close(pdf_fig)
+        st.plotly_chart(fig_anim, use_container_width=True)
+
+    # Lap summary
+    st.subheader("🗘️ Lap Summary")
+    sum_df = pd.DataFrame({
+        'Driver': [driver1, driver2],
+        'Team': [team1, team2],
+        'Lap Time (s)': [lap1['LapTime_s'], lap2['LapTime_s']],
+        'Compound': [lap1['Compound'], lap2['Compound']],
+        'TrackStatus': [lap1['TrackStatus'], lap2['TrackStatus']]
+    })
+    st.table(sum_df)
+
+    # Lap-by-lap comparison
+    st.subheader("🔁 Lap-by-Lap Time Comparison")
+    # Inner merge keeps only laps both drivers completed as quick laps
+    comparison_df = pd.merge(
+        driver1_quicklaps[['LapNumber', 'LapTime_s']].reset_index(drop=True),
+        driver2_quicklaps[['LapNumber', 'LapTime_s']].reset_index(drop=True),
+        on='LapNumber',
+        how='inner',
+        suffixes=('_1', '_2')
+    )
+
+    fig2 = go.Figure()
+    fig2.add_trace(go.Scattergl(x=comparison_df['LapNumber'], y=comparison_df['LapTime_s_1'], mode='lines+markers', name=driver1, line=dict(color=color1)))
+    fig2.add_trace(go.Scattergl(x=comparison_df['LapNumber'], y=comparison_df['LapTime_s_2'], mode='lines+markers', name=driver2, line=dict(color=color2)))
+    fig2.update_layout(
+        title="Lap-by-Lap Time Comparison",
+        xaxis_title="Lap Number",
+        yaxis_title="Lap Time (s)",
+        template='plotly_dark'
+    )
+    st.plotly_chart(fig2, use_container_width=True)
+
+    # Export section
+    st.subheader("📁 Export Data")
+    if st.button("Download Telemetry CSV", key='csv_download_button'):
+        csv_df = pd.DataFrame({
+            'Distance': telemetry1['Distance'],
+            f'{driver1}_Speed': telemetry1['Speed'],
+            f'{driver2}_Speed': telemetry2['Speed']
+        }).dropna()
+        # pyarrow always quotes header names, so write the header row ourselves
+        csv_buf = io.BytesIO()
+        csv_buf.write((','.join(csv_df.columns) + '\n').encode('utf-8'))
+        pacsv.write_csv(pa.Table.from_pandas(csv_df, preserve_index=False), csv_buf, pacsv.WriteOptions(include_header=False))
+        st.download_button("Download Telemetry CSV", csv_buf.getvalue(), file_name="telemetry_comparison.csv", mime="text/csv")
+
+    if st.button("Download PDF Plot", key='pdf_download_button'):
+        # Reuse one figure per browser session instead of allocating a canvas per export
+        if 'pdf_figure' not in st.session_state:
+            from matplotlib.figure import Figure
+
+            pdf_fig = Figure()
+            st.session_state['pdf_figure'] = (pdf_fig, pdf_fig.subplots())
+        pdf_fig, pdf_ax = st.session_state['pdf_figure']
+        pdf_ax.clear()
+        pdf_ax.plot(telemetry1['Distance'], telemetry1['Speed'], label=driver1, color=color1)
+        pdf_ax.plot(telemetry2['Distance'], telemetry2['Speed'], label=driver2, color=color2)
+        pdf_ax.set_xlabel("Distance")
+        pdf_ax.set_ylabel("Speed")
+        pdf_ax.set_title("Speed Comparison")
+        pdf_ax.legend()
+        pdf_buf = io.BytesIO()
+        pdf_fig.savefig(pdf_buf, format='pdf')
+        pdf_buf.seek(0)
+        st.download_button("Download PDF", pdf_buf, file_name="speed_plot.pdf")
+
+telemetry_section(session, drivers)
 
 st.markdown("---")
 st.markdown("Built with ❤️ by Legion Gamer")